@@ -1,49 +1,52 @@
 # Python libraries
-from email import message
-from enum import Enum
-from typing import Optional
+from os import SEEK_END
+from typing import Any, Dict, List, Literal, Optional
+from urllib.parse import parse_qsl
 
 # Pydantic
 from pydantic import BaseModel
 from pydantic import Field
-from pydantic import EmailStr
+
+# Email validator
+from email_validator import EmailNotValidError, validate_email
 
 # FastAPI
 from fastapi import FastAPI
 from fastapi import status
 from fastapi import HTTPException
-from fastapi import Body, Query, Path, Form, Cookie, Header, UploadFile, File
+from fastapi import Request
+from fastapi import Body, Query, Path, Cookie, Header, UploadFile, File
+from fastapi.responses import ORJSONResponse
+
+# orjson
+import orjson
+
+
+class NonStrKeysORJSONResponse(ORJSONResponse):
+    """ORJSONResponse que acepta llaves no str, como {person_id: ...}."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
 
 
-app = FastAPI()
+app = FastAPI(default_response_class=NonStrKeysORJSONResponse)
 
 
-# Enum's
+# Literal's
 # Definimos la lista de colores permitida para el
 # atributo dentro del modelo
 
-class HairColor(Enum):
-    white = "white"
-    brown = "brown"
-    black = "black"
-    blonde = "blonde"
-    red = "red"
+HairColor = Literal["white", "brown", "black", "blonde", "red"]
 
 # Definimos la lista de paises permitidos.
 
-
-class Countries(Enum):
-    mexico = "México"
-    colombia = "Colombia"
-    peru = "Perú"
-    venezuela = "Venezuela"
-    chile = "Chile"
-    argentina = "Argentina"
+Countries = Literal["México", "Colombia", "Perú",
+                    "Venezuela", "Chile", "Argentina"]
 
 # Models (Para poder validar la estructura del Body Request)
 
 
-class Person(BaseModel):
+class PersonOut(BaseModel):
     first_name: str = Field(
         ...,
         min_length=1,
@@ -62,6 +65,10 @@ class Person(BaseModel):
     hair_color: Optional[HairColor] = Field(default=None)
     is_married: Optional[bool] = Field(default=None)
 
+
+# Person agrega el password a PersonOut. Así el modelo de respuesta no tiene
+# el campo password y no hace falta excluirlo al responder.
+class Person(PersonOut):
     password: str = Field(..., min_length=8)
 
     # Ejemplo de como configurar unos valores de prueba para la documentacion
@@ -117,12 +124,14 @@ def home():
 
 # Enviar datos desde el cliente -> servidor
 @app.post(path="/person/new",
-          response_model=Person,
-          response_model_exclude={"password"},
+          response_model=PersonOut,
           status_code=status.HTTP_201_CREATED,
           tags=["Persons"])
 def create_person(user: Person = Body(...)):
-    return user
+    # Person no tiene modelos anidados: basta con copiar su __dict__
+    person = dict(user.__dict__)
+    del person["password"]
+    return PersonOut.construct(**person)
 
 
 # Validaciones de Query Parameters
@@ -151,13 +160,13 @@ def show_person(
 
 # Validaciones de Path Parameters
 
-persons = [1, 2, 3, 4, 5]
+persons = frozenset((1, 2, 3, 4, 5))
 
 
 @app.get(path="/person/detail/{person_id}",
          status_code=status.HTTP_200_OK,
          tags=["Persons"])
-def show_person(
+def show_person_by_id(
     person_id: int = Path(
         ...,
         gt=0,
@@ -190,39 +199,110 @@ def update_person(
     location: Location = Body(...)
 ):
 
-    results = {"id": person_id}
-    results.update(person.dict())
-    results.update(location.dict())
-    return results
+    # Los campos ya son tipos simples (str, int, bool), así que se puede
+    # usar __dict__ directamente en lugar de recorrer el modelo con .dict()
+    return {"id": person_id, **person.__dict__, **location.__dict__}
+
 
 # Recibir información de Formularios
+# Los formularios urlencoded se leen con parse_qsl en una sola pasada, en
+# lugar de usar Form(...) y el parser de Starlette campo por campo.
+
+FORM_URLENCODED = "application/x-www-form-urlencoded"
+MAX_FORM_FIELDS = 8
+
+
+async def read_form(request: Request) -> Dict[str, Any]:
+    if request.headers.get("content-type", "").startswith(FORM_URLENCODED):
+        body = (await request.body()).decode("latin-1")
+        try:
+            return dict(parse_qsl(body, max_num_fields=MAX_FORM_FIELDS))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="Too many form fields")
+    return dict(await request.form())
+
+
+def form_error(field: str, msg: str, error_type: str) -> HTTPException:
+    # Mismo formato de error que las validaciones de FastAPI
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail=[{"loc": ["body", field], "msg": msg, "type": error_type}]
+    )
+
+
+def form_field(form: Dict[str, Any], field: str,
+               min_length: int = 0, max_length: Optional[int] = None) -> str:
+    value = form.get(field)
+    if not isinstance(value, str):
+        raise form_error(field, "field required", "value_error.missing")
+    if len(value) < min_length:
+        raise form_error(
+            field,
+            f"ensure this value has at least {min_length} characters",
+            "value_error.any_str.min_length")
+    if max_length is not None and len(value) > max_length:
+        raise form_error(
+            field,
+            f"ensure this value has at most {max_length} characters",
+            "value_error.any_str.max_length")
+    return value
+
+
+def form_body(properties: Dict[str, Any],
+              required: List[str]) -> Dict[str, Any]:
+    # Documenta el formulario en Swagger o Redoc
+    schema = {"type": "object", "properties": properties, "required": required}
+    return {"requestBody": {"content": {FORM_URLENCODED: {"schema": schema}},
+                            "required": True}}
 
 
 @app.post(path="/login",
           response_model=LoginOut,
           status_code=status.HTTP_200_OK,
-          tags=["Login"])
-def login(username: str = Form(...), password: str = Form(...)):
-    return LoginOut(username=username)
+          tags=["Login"],
+          openapi_extra=form_body(
+              {"username": {"title": "Username", "type": "string"},
+               "password": {"title": "Password", "type": "string"}},
+              ["username", "password"]))
+async def login(request: Request):
+    form = await read_form(request)
+    username = form_field(form, "username")
+    form_field(form, "password")
+    # construct() crea el modelo sin validarlo; FastAPI ya lo valida
+    # al aplicar el response_model.
+    return LoginOut.construct(username=username)
 
 # Recibir Cookies and Headers
 
 
 @app.post(path="/contact",
           status_code=status.HTTP_200_OK,
-          tags=["Contact"])
-def contact(first_name: str = Form(...,
-                                   min_length=1,
-                                   max_length=20),
-            last_name: str = Form(...,
-                                  min_length=1,
-                                  max_length=20),
-            email: EmailStr = Form(...),
-            message: str = Form(...,
-                                min_length=20),
-            user_agent: Optional[str] = Header(default=None),
-            ads: Optional[str] = Cookie(default=None)
-            ):
+          tags=["Contact"],
+          openapi_extra=form_body(
+              {"first_name": {"title": "First Name", "type": "string",
+                              "minLength": 1, "maxLength": 20},
+               "last_name": {"title": "Last Name", "type": "string",
+                             "minLength": 1, "maxLength": 20},
+               "email": {"title": "Email", "type": "string",
+                         "format": "email"},
+               "message": {"title": "Message", "type": "string",
+                           "minLength": 20}},
+              ["first_name", "last_name", "email", "message"]))
+async def contact(request: Request,
+                  user_agent: Optional[str] = Header(default=None),
+                  ads: Optional[str] = Cookie(default=None)
+                  ):
+    form = await read_form(request)
+    form_field(form, "first_name", min_length=1, max_length=20)
+    form_field(form, "last_name", min_length=1, max_length=20)
+    form_field(form, "message", min_length=20)
+    # El email se valida una sola vez, después de leer el formulario
+    try:
+        validate_email(form_field(form, "email"), check_deliverability=False)
+    except EmailNotValidError:
+        raise form_error("email", "value is not a valid email address",
+                         "value_error.email")
     return user_agent
 
 # UploadFiles y Files
@@ -230,7 +310,13 @@ def contact(first_name: str = Form(...,
 
 @app.post(path="/post-image",
           tags=["Image"])
-def post_image(image: UploadFile = File(...)):
+async def post_image(image: UploadFile = File(...)):
+    # El archivo ya está en un SpooledTemporaryFile (en memoria hasta 1 MiB,
+    # en disco si es más grande): basta con ir al final y preguntar la
+    # posición, sin leer ningún byte.
+    image.file.seek(0, SEEK_END)
+    size = image.file.tell()
+
     return {"Filename": image.filename,
             "Format": image.content_type,
-            "Size (kb)": round(len(image.file.read()) / 1024, ndigits=2)}
+            "Size (kb)": round(size / 1024, ndigits=2)}
@@ -1,72 +1,280 @@
 # Python
-import json
+import asyncio
+import logging
+import os
+import re
+from collections import Counter
 from uuid import UUID   # Clase que nos ayuda a trabajar con id únicos
 from datetime import date
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
-# Pydantic
-from pydantic import BaseModel
-from pydantic import EmailStr
-from pydantic import Field
+# aiofiles y msgspec
+import aiofiles
+import msgspec
+from msgspec import Meta
+from typing_extensions import Annotated
+
+# Email validator
+from email_validator import EmailNotValidError, validate_email
 
 # FastAPI
 from fastapi import FastAPI
 from fastapi import status
-from fastapi import Body
+from fastapi import HTTPException
+from fastapi import Request
+from fastapi import Response
+from fastapi.openapi.utils import get_openapi
+from fastapi.responses import ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
 
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 
 # MODELS
+# Los modelos son msgspec.Struct en lugar de BaseModel de Pydantic: msgspec
+# decodifica y valida el JSON en C, sin recorrer validadores en Python.
+
+# msgspec no valida emails: se revisan con check_email después de decodificar
+Email = Annotated[str, Meta(extra_json_schema={"format": "email"})]
+Name = Annotated[str, Meta(min_length=1, max_length=50)]
+Password = Annotated[str, Meta(min_length=8)]
 
-class UserBase(BaseModel):
-    user_id: UUID = Field(...)
-    email: EmailStr = Field(...)
+
+class UserBase(msgspec.Struct, frozen=True):
+    user_id: UUID
+    email: Email
 
 
 class UserLogin(UserBase):
-    password: str = Field(
-        ...,
-        min_length=8
-    )
+    password: Password
 
 
 class User(UserBase):
-    first_name: str = Field(
-        ...,
-        min_length=1,
-        max_length=50
-    )
-    last_name: str = Field(
-        ...,
-        min_length=1,
-        max_length=50
-    )
-    birth_date: Optional[date] = Field(default=None)
+    first_name: Name
+    last_name: Name
+    birth_date: Optional[date] = None
+
+
+class UserRegister(User, kw_only=True):
+    password: Password
+
+
+class Tweet(msgspec.Struct, frozen=True, kw_only=True):
+    tweet_id: UUID
+    content: Annotated[str, Meta(min_length=1, max_length=256)]
+    created_at: datetime = msgspec.field(default_factory=datetime.now)
+    updated_at: Optional[datetime] = None
+    by: User
+
+
+class TweetDate(msgspec.Struct):
+    """Solo la columna created_at de un tweet, para las estadísticas."""
+    created_at: datetime
+
+
+# Decoders y Encoder reutilizables (se construyen una sola vez)
+user_register_decoder = msgspec.json.Decoder(UserRegister)
+user_decoder = msgspec.json.Decoder(User)
+tweet_decoder = msgspec.json.Decoder(Tweet)
+tweet_date_decoder = msgspec.json.Decoder(TweetDate)
+encoder = msgspec.json.Encoder()
+
+
+class MsgspecResponse(Response):
+    """Response que serializa con msgspec, sin pasar por jsonable_encoder."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):      # JSON ya codificado, se envía tal cual
+            return content
+        return encoder.encode(content)
+
+
+# Cache en memoria de los listados ya codificados a JSON, por archivo.
+# Se invalida cuando cambia el mtime o el tamaño del archivo.
+_cache = {}
+
+
+async def read_lines(path: str) -> bytes:
+    # El writer puede estar agregando un lote mientras se lee: se ignora
+    # la última línea si todavía no termina en "\n".
+    async with aiofiles.open(path, "rb") as f:
+        data = await f.read()
+    return data[:data.rfind(b"\n") + 1]
+
+
+async def read_cached(path: str,
+                      decoder: Optional[msgspec.json.Decoder] = None) -> bytes:
+    stat = os.stat(path)
+    cached_key, body = _cache.get(path, (None, None))
+    if (stat.st_mtime_ns, stat.st_size) != cached_key:
+        data = await read_lines(path)
+        # La llave usa el tamaño leído: si se ignoró una línea incompleta,
+        # la siguiente petición vuelve a leer el archivo.
+        key = (stat.st_mtime_ns, len(data))
+        if decoder is None:
+            # Cada línea ya es JSON válido: se arma la lista sin decodificar
+            lines = [line for line in data.splitlines() if line.strip()]
+            body = b"[" + b",".join(lines) + b"]"
+        else:
+            body = encoder.encode(decoder.decode_lines(data))
+        _cache[path] = (key, body)
+    return body
+
+
+# Escrituras en lote: signup y post solo encolan la línea a agregar y
+# responden. Una tarea de fondo toma todas las líneas pendientes (hasta
+# WRITE_BATCH_SIZE) y las escribe con un solo write y un solo fsync por
+# archivo; mientras escribe, las nuevas líneas se acumulan para el siguiente
+# lote. Si la escritura falla, el lote se reintenta con espera exponencial
+# y solo se descarta después de WRITE_MAX_ATTEMPTS intentos.
+
+WRITE_BATCH_SIZE = 64
+WRITE_MAX_ATTEMPTS = 5
+WRITE_RETRY_DELAY = 0.1     # segundos, se duplica en cada reintento
+logger = logging.getLogger("uvicorn.error")
+
+
+def write_batch(pending: Dict[str, List[bytes]]) -> None:
+    # Quita de pending cada archivo ya escrito, para que un reintento no
+    # duplique sus líneas. Si un write falla a la mitad, se trunca el
+    # archivo a su tamaño anterior.
+    for path in list(pending):
+        data = memoryview(b"".join(pending[path]))
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            start = os.fstat(fd).st_size
+            try:
+                while data:
+                    data = data[os.write(fd, data):]
+                os.fsync(fd)
+            except OSError:
+                os.ftruncate(fd, start)
+                raise
+        finally:
+            os.close(fd)
+        del pending[path]
+
+
+async def writer(queue: asyncio.Queue) -> None:
+    while True:
+        batch = [await queue.get()]
+        while len(batch) < WRITE_BATCH_SIZE and not queue.empty():
+            batch.append(queue.get_nowait())
+        pending: Dict[str, List[bytes]] = {}
+        for path, line in batch:
+            pending.setdefault(path, []).append(line)
+        try:
+            for attempt in range(1, WRITE_MAX_ATTEMPTS + 1):
+                try:
+                    await run_in_threadpool(write_batch, pending)
+                    break
+                except Exception:
+                    logger.exception("Could not write records (attempt %d/%d)",
+                                     attempt, WRITE_MAX_ATTEMPTS)
+                    if attempt < WRITE_MAX_ATTEMPTS:
+                        await asyncio.sleep(WRITE_RETRY_DELAY * 2 ** (attempt - 1))
+            else:
+                for path, lines in pending.items():
+                    logger.error("Lost %d records for %s after %d attempts",
+                                 len(lines), path, WRITE_MAX_ATTEMPTS)
+        finally:
+            for _ in batch:
+                queue.task_done()
+
+
+@app.on_event("startup")
+async def start_writer():
+    app.state.write_queue = asyncio.Queue()
+    app.state.writer_task = asyncio.create_task(writer(app.state.write_queue))
+
+
+@app.on_event("shutdown")
+async def stop_writer():
+    await app.state.write_queue.join()      # Escribe lo pendiente antes de salir
+    app.state.writer_task.cancel()
+
+
+def check_email(email: str, loc: List[str]) -> None:
+    # Misma validación que EmailStr de Pydantic, con el formato de error
+    # de FastAPI
+    try:
+        validate_email(email, check_deliverability=False)
+    except EmailNotValidError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=[{"loc": ["body"] + loc,
+                     "msg": "value is not a valid email address",
+                     "type": "value_error.email"}]
+        )
+
+
+def decode_body(decoder: msgspec.json.Decoder, body: bytes) -> Any:
+    # Decodifica el Request Body; los errores se devuelven con el mismo
+    # formato que las validaciones de FastAPI. msgspec indica el campo al
+    # final del mensaje, por ejemplo "... - at `$.by.email`"
+    try:
+        return decoder.decode(body)
+    except msgspec.DecodeError as exc:
+        msg, _, path = str(exc).partition(" - at `$")
+        loc: List[Any] = ["body"]
+        for key, index in re.findall(r"\.([^.\[`]+)|\[(\d+)\]", path):
+            loc.append(key if key else int(index))
+        missing = re.match(r"Object missing required field `(.+)`$", msg)
+        if missing:
+            loc.append(missing.group(1))
+            error_type = "value_error.missing"
+        elif isinstance(exc, msgspec.ValidationError):
+            error_type = "value_error"
+        else:
+            error_type = "value_error.jsondecode"
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=[{"loc": loc, "msg": msg, "type": error_type}]
+        )
+
+
+# Esquemas para la documentación (Swagger o Redoc). Como FastAPI no conoce
+# los msgspec.Struct, los esquemas se generan con msgspec y se agregan a
+# los componentes del OpenAPI.
+
+(
+    user_schema,
+    user_register_schema,
+    tweet_schema,
+    users_schema,
+    tweets_schema,
+    tweets_per_day_schema
+), schema_components = msgspec.json.schema_components(
+    (User, UserRegister, Tweet, List[User], List[Tweet], Dict[date, int]),
+    ref_template="#/components/schemas/{name}"
+)
 
 
-class UserRegister(User):
-        password: str = Field(
-        ...,
-        min_length=8
-    )
+def json_body(schema: dict) -> dict:
+    return {"requestBody": {"content": {"application/json": {"schema": schema}},
+                            "required": True}}
 
-class Tweet(BaseModel):
-    tweet_id: UUID = Field(...)
-    content: str = Field(
-        ...,
-        min_length=1,
-        max_length=256
-    )
-    created_at: datetime = Field(
-        default=datetime.now()
-    )
-    updated_at: Optional[datetime] = Field(
-        default=None
-    )
-    by: User = Field(...)
+
+def json_response(status_code: int, schema: dict) -> dict:
+    return {status_code: {"content": {"application/json": {"schema": schema}}}}
+
+
+def custom_openapi():
+    if app.openapi_schema:
+        return app.openapi_schema
+    openapi_schema = get_openapi(title=app.title,
+                                 version=app.version,
+                                 routes=app.routes)
+    openapi_schema.setdefault("components", {}).setdefault(
+        "schemas", {}).update(schema_components)
+    app.openapi_schema = openapi_schema
+    return app.openapi_schema
+
+
+app.openapi = custom_openapi
 
 
 # Path Operations
@@ -75,12 +283,14 @@ class Tweet(BaseModel):
 
 @app.post(
     path="/signup",
-    response_model=User,
     status_code=status.HTTP_201_CREATED,
+    response_class=MsgspecResponse,
+    responses=json_response(status.HTTP_201_CREATED, user_schema),
+    openapi_extra=json_body(user_register_schema),
     summary="Register a User",
     tags=["Users"]
 )
-def signup(user: UserRegister = Body(...)):
+async def signup(request: Request):
     """
     Signup
 
@@ -97,25 +307,22 @@ def signup(user: UserRegister = Body(...)):
         - last_name: str
         - birth_date: date
     """
-    with open("users.json", "r+", encoding="utf-8") as f:
-        # results = json.loads(f.read())    # Lee primero el archivo y lo guarda en un string. Y después ese string lo parsea a objetos tipo json 
-        results = json.load(f)              # Le deja todo el trabajo de leer e interpretar a la libreria JSON
-        user_dict = user.dict()             # Request Body to Dictionary
-        user_dict["user_id"] = str(user_dict["user_id"])
-        user_dict["birth_date"] = str(user_dict["birth_date"])
-
-        results.append(user_dict)
-
-        f.seek(0)                           # Me muevo al inicio del archivo
-        # f.write(json.dumps(results))      # Convierte string a json 
-        json.dump(results, f)               # Lo mismo que el anterior pero en automatico
-        return user
+    user = decode_body(user_register_decoder, await request.body())
+    check_email(user.email, ["email"])
+    # Los archivos son NDJSON (un objeto JSON por línea): registrar un
+    # usuario solo agrega una línea al final, sin releer ni reescribir todo.
+    line = encoder.encode(user) + b"\n"    # msgspec serializa UUID y date directamente
+    await request.app.state.write_queue.put(("users.ndjson", line))
+    return MsgspecResponse(User(user.user_id, user.email, user.first_name,
+                                user.last_name, user.birth_date),
+                           status_code=status.HTTP_201_CREATED)
 
 
 @app.post(
     path="/login",
-    response_model=User,
     status_code=status.HTTP_200_OK,
+    response_class=MsgspecResponse,
+    responses=json_response(status.HTTP_200_OK, user_schema),
     summary="Login a User",
     tags=["Users"]
 )
@@ -125,12 +332,13 @@ def login():
 
 @app.get(
     path="/users",
-    response_model=List[User],
     status_code=status.HTTP_200_OK,
+    response_class=MsgspecResponse,
+    responses=json_response(status.HTTP_200_OK, users_schema),
     summary="Show all users",
     tags=["Users"]
 )
-def show_all_users():
+async def show_all_users():
     """
     This path operation shows all users in the app
 
@@ -143,14 +351,15 @@ def show_all_users():
         - last_name: str
         - birth_date: date
     """
-    with open("users.json", "r", encoding="utf-8") as f:
-        return json.load(f)
+    # Se decodifica como User para no devolver el password
+    return MsgspecResponse(await read_cached("users.ndjson", user_decoder))
 
         
 @app.get(
     path="/users/{user_id}",
-    response_model=User,
     status_code=status.HTTP_200_OK,
+    response_class=MsgspecResponse,
+    responses=json_response(status.HTTP_200_OK, user_schema),
     summary="Show a User",
     tags=["Users"]
 )
@@ -159,8 +368,9 @@ def show_a_user():
 
 @app.delete(
     path="/users/{user_id}/delete",
-    response_model=User,
     status_code=status.HTTP_200_OK,
+    response_class=MsgspecResponse,
+    responses=json_response(status.HTTP_200_OK, user_schema),
     summary="Delete a User",
     tags=["Users"]
 )
@@ -169,24 +379,26 @@ def delete_a_user():
 
 @app.put(
     path="/users/{user_id}/update",
-    response_model=User,
     status_code=status.HTTP_200_OK,
+    response_class=MsgspecResponse,
+    responses=json_response(status.HTTP_200_OK, user_schema),
     summary="Update a User",
     tags=["Users"]
 )
-def delete_a_user():
+def update_a_user():
     pass
 
 ## Path Operations of Tweets
 
 @app.get(
     path="/",
-    response_model=List[Tweet],
     status_code=status.HTTP_200_OK,
+    response_class=MsgspecResponse,
+    responses=json_response(status.HTTP_200_OK, tweets_schema),
     summary="Show all tweets",
     tags=["Tweets"]
     )
-def home():
+async def home():
     """
     This path operation shows all tweets in the app
 
@@ -199,18 +411,20 @@ def home():
         - updated_at: Optional[datetime]
         - by: User
     """
-    with open("tweets.json", "r", encoding="utf-8") as f:
-        return json.load(f)
+    # Los tweets se validaron al publicarse, se envían tal cual están guardados
+    return MsgspecResponse(await read_cached("tweets.ndjson"))
 
 
 @app.post(
     path="/post",
-    response_model=Tweet,
     status_code=status.HTTP_201_CREATED,
+    response_class=MsgspecResponse,
+    responses=json_response(status.HTTP_201_CREATED, tweet_schema),
+    openapi_extra=json_body(tweet_schema),
     summary="Post a tweet",
     tags=["Tweets"]
 )
-def post(tweet: Tweet = Body(...)):
+async def post(request: Request):
     """
     Post a Tweet
 
@@ -228,28 +442,41 @@ def post(tweet: Tweet = Body(...)):
         - by: User
 
     """
-    with open("tweets.json", "r+", encoding="utf-8") as f:
-        # results = json.loads(f.read())    # Lee primero el archivo y lo guarda en un string. Y después ese string lo parsea a objetos tipo json 
-        results = json.load(f)              # Le deja todo el trabajo de leer e interpretar a la libreria JSON
-        tweet_dict = tweet.dict()             # Request Body to Dictionary
-        tweet_dict["tweet_id"] = str(tweet_dict["tweet_id"])
-        tweet_dict["created_at"] = str(tweet_dict["created_at"])
-        tweet_dict["updated_at"] = str(tweet_dict["updated_at"])
-        tweet_dict["by"]["user_id"] = str(tweet_dict["by"]["user_id"])
-        tweet_dict["by"]["birth_date"] = str(tweet_dict["by"]["birth_date"])
+    tweet = decode_body(tweet_decoder, await request.body())
+    check_email(tweet.by.email, ["by", "email"])
+    line = encoder.encode(tweet) + b"\n"   # msgspec serializa UUID y datetime directamente
+    await request.app.state.write_queue.put(("tweets.ndjson", line))
+    return MsgspecResponse(tweet, status_code=status.HTTP_201_CREATED)
+
 
-        results.append(tweet_dict)
+@app.get(
+    path="/stats/tweets-per-day",
+    status_code=status.HTTP_200_OK,
+    response_class=MsgspecResponse,
+    responses=json_response(status.HTTP_200_OK, tweets_per_day_schema),
+    summary="Count tweets per day",
+    tags=["Tweets"]
+)
+async def tweets_per_day():
+    """
+    This path operation counts how many tweets were posted each day
 
-        f.seek(0)                           # Me muevo al inicio del archivo
-        # f.write(json.dumps(results))      # Convierte string a json 
-        json.dump(results, f)               # Lo mismo que el anterior pero en automatico
-        return tweet
+    Parameters:
+        -
+    Return a json object with the day (date) as key and the number
+    of tweets (int) as value, ordered by day.
+    """
+    # Solo se decodifica created_at; msgspec se salta el resto de los campos
+    tweets = tweet_date_decoder.decode_lines(await read_lines("tweets.ndjson"))
+    counts = Counter(tweet.created_at.date() for tweet in tweets)
+    return MsgspecResponse(dict(sorted(counts.items())))
 
 
 @app.get(
     path="/tweets/{tweet_id}",
-    response_model=Tweet,
     status_code=status.HTTP_200_OK,
+    response_class=MsgspecResponse,
+    responses=json_response(status.HTTP_200_OK, tweet_schema),
     summary="Show a tweet",
     tags=["Tweets"]
 )
@@ -259,8 +486,9 @@ def show_a_tweet():
 
 @app.delete(
     path="/tweets/{tweet_id}/delete",
-    response_model=Tweet,
     status_code=status.HTTP_200_OK,
+    response_class=MsgspecResponse,
+    responses=json_response(status.HTTP_200_OK, tweet_schema),
     summary="Delete a tweet",
     tags=["Tweets"]
 )
@@ -270,8 +498,9 @@ def delete_a_tweet():
 
 @app.put(
     path="/tweets/{tweet_id}/update",
-    response_model=Tweet,
     status_code=status.HTTP_200_OK,
+    response_class=MsgspecResponse,
+    responses=json_response(status.HTTP_200_OK, tweet_schema),
     summary="Update a tweet",
     tags=["Tweets"]
 )